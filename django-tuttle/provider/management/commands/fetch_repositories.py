@@ -1,7 +1,11 @@
 import logging
+import os
+import time
 
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
+from provider.synchronizer.batch import synchronize_users
+from provider.synchronizer.ratelimit import RateLimitParked
 from provider.synchronizer.synchronize import synchronize
 
 logger = logging.getLogger()
@@ -12,12 +16,56 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         # arguments required for launch the command
-        parser.add_argument('-u', '--user', dest='user', required=True)
+        users = parser.add_mutually_exclusive_group(required=True)
+        users.add_argument('-u', '--user', dest='user')
+        users.add_argument('--all', dest='all', action='store_true',
+                           help='synchronize every user with a token')
+        users.add_argument('--users-from', dest='users_from', metavar='FILE',
+                           help='synchronize the users listed in FILE, one username for each line')
+        parser.add_argument('-w', '--workers', dest='workers', type=int, default=os.cpu_count() or 1,
+                            help='number of processes used to synchronize many users')
 
     def handle(self, *args, **options):
         user_argument = options['user']
+        if user_argument is None:
+            return self.handle_batch(options)
         try:
             user = get_user_model().objects.get(username=user_argument)
         except get_user_model().DoesNotExist:
             raise CommandError('User object doesn\'t exist')
-        synchronize(user)
+        try:
+            synchronize(user)
+        except RateLimitParked as ex:
+            self.stdout.write('%s: %s' % (user.username, ex))
+
+    def handle_batch(self, options):
+        users = get_user_model().objects.order_by('pk')
+        if options['all']:
+            users = users.filter(token__isnull=False).distinct()
+        else:
+            with open(options['users_from']) as users_file:
+                usernames = {line.strip() for line in users_file if line.strip() and not line.startswith('#')}
+            users = users.filter(username__in=usernames)
+            missing = usernames - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError('User objects don\'t exist: %s' % ', '.join(sorted(missing)))
+
+        start = time.time()
+        outcomes = []
+        for outcome in synchronize_users(list(users.values_list('pk', flat=True)), options['workers']):
+            outcomes.append(outcome)
+            if outcome.parked_until is not None:
+                self.stdout.write('%s: parked until %s' % (outcome.username, outcome.parked_until.isoformat()))
+            elif outcome.error is None:
+                self.stdout.write('%s: synchronized in %.2fs' % (outcome.username, outcome.duration))
+            else:
+                self.stdout.write('%s: failed in %.2fs (%s)' % (outcome.username, outcome.duration, outcome.error))
+
+        failed = [outcome for outcome in outcomes if outcome.error is not None]
+        parked = [outcome for outcome in outcomes if outcome.parked_until is not None]
+        durations = [outcome.duration for outcome in outcomes] or [0]
+        self.stdout.write('%s users synchronized, %s parked, %s failed in %.2fs (sync time total %.2fs, max %.2fs)' % (
+            len(outcomes) - len(failed) - len(parked), len(parked), len(failed), time.time() - start,
+            sum(durations), max(durations)))
+        if failed:
+            raise CommandError('%s users failed to synchronize' % len(failed))
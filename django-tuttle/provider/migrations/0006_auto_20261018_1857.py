@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:57
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('provider', '0005_auto_20160908_0746'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheValidator',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.CharField(blank=True, max_length=255)),
+                ('token', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='provider.Token')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='cachevalidator',
+            unique_together=set([('token', 'url')]),
+        ),
+    ]
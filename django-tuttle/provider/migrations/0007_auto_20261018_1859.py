@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:59
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from provider.ssh import fingerprint
+
+
+def compute_fingerprints(apps, schema_editor):
+    DeployKey = apps.get_model('provider', 'DeployKey')
+    for deploy_key in DeployKey.objects.all().iterator():
+        DeployKey.objects.filter(pk=deploy_key.pk).update(fingerprint=fingerprint(deploy_key.key))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('provider', '0006_auto_20261018_1857'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deploykey',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='deploykey',
+            name='github_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(compute_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 19:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('provider', '0007_auto_20261018_1859'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='token',
+            name='rate_limit_remaining',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='token',
+            name='rate_limit_reset',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 19:06
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def forget_listing_validators(apps, schema_editor):
+    """
+    the stored repositories don't know their listing page yet: without validators the
+    next synchronization reads every page of the listing
+    """
+    CacheValidator = apps.get_model('provider', 'CacheValidator')
+    CacheValidator.objects.filter(url__startswith='/user/repos?').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('provider', '0008_auto_20261018_1903'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run', models.PositiveIntegerField(default=0)),
+                ('listing_page', models.PositiveIntegerField(default=0)),
+                ('listing_done', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='repository',
+            name='keys_run',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='repository',
+            name='listing_page',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(forget_listing_validators, migrations.RunPython.noop),
+    ]
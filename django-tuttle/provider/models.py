@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.db import models
 
+from provider.ssh import fingerprint
+
 
 class Provider(models.Model):
     """
@@ -23,6 +25,10 @@ class Repository(models.Model):
     is_user_admin = models.BooleanField(default=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
     provider = models.ForeignKey(Provider)
+    # synchronization progress: page of the listing the repository was read from and
+    # SyncState.run in which its deploy keys were fetched
+    listing_page = models.PositiveIntegerField(blank=True, null=True)
+    keys_run = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
@@ -34,11 +40,18 @@ class DeployKey(models.Model):
     """
     title = models.CharField(max_length=255)
     key = models.CharField(max_length=800)
+    fingerprint = models.CharField(max_length=64, blank=True)
+    github_id = models.BigIntegerField(blank=True, null=True)
     repository = models.ForeignKey(Repository)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if not self.fingerprint:
+            self.fingerprint = fingerprint(self.key)
+        super().save(*args, **kwargs)
+
 
 class Token(models.Model):
     """
@@ -48,6 +61,42 @@ class Token(models.Model):
     token = models.CharField(max_length=800, unique=True)
     provider = models.ForeignKey(Provider)
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    # rate limit budget left at the end of the last synchronization
+    rate_limit_remaining = models.IntegerField(blank=True, null=True)
+    rate_limit_reset = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return self.title
+
+
+class CacheValidator(models.Model):
+    """
+    CacheValidator model: stores the ETag/Last-Modified validators of a provider's
+    resource, sent back on the next synchronization to receive 304 when it's unchanged
+    """
+    token = models.ForeignKey(Token)
+    url = models.CharField(max_length=500)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        unique_together = ('token', 'url')
+
+    def __str__(self):
+        return self.url
+
+
+class SyncState(models.Model):
+    """
+    SyncState model: stores the progress of the user's synchronization, so that an
+    interrupted run resumes where it stopped
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL)
+    run = models.PositiveIntegerField(default=0)
+    listing_page = models.PositiveIntegerField(default=0)
+    listing_done = models.BooleanField(default=False)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return '%s run %s' % (self.user, self.run)
@@ -0,0 +1,18 @@
+import base64
+import binascii
+import hashlib
+
+
+def fingerprint(key):
+    """
+    SHA256 fingerprint of an openssh public key, in the format printed by ssh-keygen -l;
+    a value that is not a valid key is fingerprinted as a whole
+    :param key: public key as "<type> <base64 blob> [comment]"
+    """
+    parts = key.split()
+    try:
+        blob = base64.b64decode(parts[1], validate=True)
+    except (IndexError, binascii.Error, ValueError):
+        blob = key.encode('utf-8')
+    digest = base64.b64encode(hashlib.sha256(blob).digest()).decode('ascii').rstrip('=')
+    return 'SHA256:%s' % digest
@@ -0,0 +1,62 @@
+import logging
+import multiprocessing
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+
+from provider.synchronizer.ratelimit import RateLimitParked
+from provider.synchronizer.synchronize import synchronize
+
+logger = logging.getLogger()
+
+# result of the synchronization of a user: error is None when it succeeded, parked_until
+# is the rate limit reset when the user's token had no budget left
+Outcome = namedtuple('Outcome', ['username', 'error', 'duration', 'parked_until'])
+
+
+def synchronize_user(user_pk):
+    """
+    synchronize a single user catching any error, so that a failure doesn't stop the batch
+    :param user_pk: primary key of the user
+    :return: Outcome
+    """
+    start = time.time()
+    user = get_user_model().objects.get(pk=user_pk)
+    try:
+        synchronize(user)
+    except RateLimitParked as ex:
+        logger.info('synchronization of %s parked until %s' % (user.username, ex.reset.isoformat()))
+        return Outcome(user.username, None, time.time() - start, ex.reset)
+    except Exception as ex:
+        logger.exception('synchronization of %s failed' % user.username)
+        return Outcome(user.username, '%s: %s' % (type(ex).__name__, ex), time.time() - start, None)
+    return Outcome(user.username, None, time.time() - start, None)
+
+
+def synchronize_users(user_pks, workers=1):
+    """
+    synchronize many users spreading them on a pool of processes; each process opens its
+    own database connection
+    :param user_pks: primary keys of the users
+    :param workers: number of processes, with 1 users are synchronized in this process
+    :return: iterator of Outcome, in completion order
+    """
+    if workers == 1:
+        for user_pk in user_pks:
+            yield synchronize_user(user_pk)
+        return
+
+    # forked processes must not share the connections of this one
+    connections.close_all()
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        for outcome in pool.imap_unordered(synchronize_user, user_pks):
+            yield outcome
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -0,0 +1,41 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from provider.models import SyncState
+
+logger = logging.getLogger()
+
+
+def start_run(user):
+    """
+    load the synchronization state of the user: a run interrupted less than
+    settings.SYNC_CHECKPOINT_TTL seconds ago is resumed, otherwise a new run starts
+    :param user: owner of the synchronization
+    :return: SyncState
+    """
+    state, created = SyncState.objects.get_or_create(user=user)
+    now = timezone.now()
+    if state.run and state.finished_at is None and \
+            state.started_at > now - timedelta(seconds=settings.SYNC_CHECKPOINT_TTL):
+        logger.info('resuming synchronization run %s of %s from page %s' % (
+            state.run, user.username, state.listing_page))
+        return state
+
+    state.run += 1
+    state.listing_page = 0
+    state.listing_done = False
+    state.started_at = now
+    state.finished_at = None
+    state.save()
+    return state
+
+
+def finish_run(state):
+    """
+    mark the run as completed, the next synchronization starts a new one
+    """
+    state.finished_at = timezone.now()
+    state.save(update_fields=['finished_at'])
@@ -0,0 +1,185 @@
+import json
+import threading
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from github import BadCredentialsException, GithubException, RateLimitExceededException, UnknownObjectException
+
+from provider.ssh import fingerprint
+from provider.synchronizer.ratelimit import RateLimiter, is_rate_limited
+
+# biggest page size accepted by the github api
+PER_PAGE = 100
+LISTING_URL = '/user/repos'
+
+
+def repository_params(data):
+    """
+    build the Repository fields from the json of a github repository; the organization
+    is read from the owner to avoid one more request for each repository
+    :param data: repository as returned by the github api
+    """
+    owner = data['owner']
+    return {
+        'name': data['name'],
+        'owner': owner['login'],
+        'organization': owner['login'] if owner['type'] == 'Organization' else None,
+        'is_private': data['private'],
+        'is_user_admin': data['permissions']['admin'],
+    }
+
+
+def key_params(data):
+    """
+    build the DeployKey fields from the json of a github deploy key
+    :param data: deploy key as returned by the github api
+    """
+    return {
+        'github_id': data['id'],
+        'title': data['title'],
+        'key': data['key'],
+        'fingerprint': fingerprint(data['key']),
+    }
+
+
+def has_next_page(headers):
+    return 'rel="next"' in headers.get('link', '')
+
+
+def parse(output):
+    """
+    decode the body of a response, None when it's empty
+    """
+    if not output:
+        return None
+    if isinstance(output, bytes):
+        output = output.decode('utf-8')
+    try:
+        return json.loads(output)
+    except ValueError:
+        return {'data': output}
+
+
+def check(status, data):
+    """
+    raise the PyGithub exception matching an error status
+    """
+    if status >= 400:
+        exception = {401: BadCredentialsException, 404: UnknownObjectException}.get(status, GithubException)
+        raise exception(status, data)
+
+
+def resource(url, parameters):
+    """
+    identify a resource of the api by its url and query string
+    """
+    return '%s?%s' % (url, urlencode(sorted(parameters.items())))
+
+
+def listing_parameters(page):
+    return {'per_page': PER_PAGE, 'page': page}
+
+
+def keys_url(owner, name):
+    return '/repos/%s/%s/keys' % (quote(owner), quote(name))
+
+
+class GithubClient(object):
+    """
+    Reads the github api through the PyGithub requester sending the validators received
+    during the previous synchronization, so that unchanged resources answer 304
+    """
+
+    def __init__(self, requester, validators=None, limiter=None):
+        """
+        :param requester: PyGithub requester of the authenticated user
+        :param validators: dict url -> (etag, last modified) of the previous synchronization
+        :param limiter: RateLimiter of the token
+        """
+        self.requester = requester
+        self.validators = validators or {}
+        self.limiter = limiter or RateLimiter()
+        # validators to store for the next synchronization, filled by many threads
+        self.responses = {}
+        self.lock = threading.Lock()
+
+    def get(self, url, parameters, conditional=True):
+        """
+        GET a resource of the github api
+        :param conditional: send the stored validators of the resource
+        :return: tuple (json data or None if the resource is not modified, response headers)
+        """
+        key = resource(url, parameters)
+        headers = {}
+        etag, last_modified = self.validators.get(key, ('', ''))
+        if conditional and etag:
+            headers['If-None-Match'] = etag
+        if conditional and last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            status, response_headers, output = self.requester.requestJson('GET', url, parameters, dict(headers))
+            data = parse(output)
+            self.limiter.update(response_headers)
+            if not is_rate_limited(status, response_headers, data):
+                break
+            if attempt == settings.SYNC_RATE_LIMIT_RETRIES:
+                raise RateLimitExceededException(status, data)
+            self.limiter.backoff(attempt, response_headers)
+            attempt += 1
+
+        check(status, data)
+        if data is not None:
+            # a 304 has no body and keeps the stored validators
+            etag, last_modified = response_headers.get('etag', ''), response_headers.get('last-modified', '')
+        with self.lock:
+            self.responses[key] = (etag, last_modified)
+        return data, response_headers
+
+    def pop_responses(self, url):
+        """
+        take the validators received for a resource, they are stored together with its data
+        :param url: resource of a listing page, or url of a keys resource covering all its pages
+        :return: dict url -> (etag, last modified)
+        """
+        with self.lock:
+            keys = [key for key in self.responses if key == url or key.startswith(url + '?')]
+            return {key: self.responses.pop(key) for key in keys}
+
+    def listing(self, start=1):
+        """
+        read the pages of the user's repositories listing one at a time
+        :param start: first page to read
+        :return: iterator of (page, list of repositories or None when the page didn't change)
+        """
+        page = start
+        while True:
+            data, headers = self.get(LISTING_URL, listing_parameters(page))
+            yield page, data
+            if data is None:
+                # the page is the same, its next page exists if it existed before
+                if resource(LISTING_URL, listing_parameters(page + 1)) not in self.validators:
+                    return
+            elif not has_next_page(headers):
+                return
+            page += 1
+
+    def keys(self, owner, name):
+        """
+        read the deploy keys of a repository
+        :return: list of deploy keys, None when they didn't change since the last synchronization
+        """
+        url = keys_url(owner, name)
+        data, headers = self.get(url, {'per_page': PER_PAGE})
+        if data is None:
+            return None
+
+        keys = list(data)
+        page = 1
+        while has_next_page(headers):
+            page += 1
+            data, headers = self.get(url, {'per_page': PER_PAGE, 'page': page}, conditional=False)
+            keys.extend(data)
+        return [key_params(key) for key in keys]
@@ -0,0 +1,44 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from django.conf import settings
+
+logger = logging.getLogger()
+
+
+def fetch_keys(client, repositories, workers=None):
+    """
+    fetch the deploy keys of many github repositories in parallel, keeping at most
+    `workers` requests in flight; the first error stops the submission of new requests
+    and is raised once the keys already fetched are yielded
+    :param client: GithubClient of the user
+    :param repositories: list of (owner, name) of the repositories
+    :param workers: size of the thread pool, defaults to settings.SYNC_KEY_WORKERS
+    :return: iterator of ((owner, name), list of deploy keys or None when unchanged), in completion order
+    """
+    workers = workers or settings.SYNC_KEY_WORKERS
+    pending = iter(repositories)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(count):
+            for natural_key in islice(pending, count):
+                running[executor.submit(client.keys, *natural_key)] = natural_key
+
+        submit(workers)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            error = None
+            for future in done:
+                natural_key = running.pop(future)
+                try:
+                    keys = future.result()
+                except Exception as ex:
+                    logger.error('deploy keys fetching failed for %s, stopping the pool' % (natural_key,))
+                    error = error or ex
+                    continue
+                yield natural_key, keys
+            if error is not None:
+                raise error
+            submit(len(done))
@@ -0,0 +1,129 @@
+import calendar
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from provider.models import Token
+
+logger = logging.getLogger()
+
+
+class RateLimitParked(Exception):
+    """
+    Raised when the token's budget is exhausted and the reset is too far to wait for it
+    """
+
+    def __init__(self, reset):
+        self.reset = reset
+        super().__init__('rate limit exhausted, parked until %s' % reset.isoformat())
+
+
+def is_rate_limited(status, headers, data):
+    """
+    tell whether a response was refused because of the primary or the secondary rate limit
+    """
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    message = (data or {}).get('message', '') if isinstance(data, dict) else ''
+    return headers.get('x-ratelimit-remaining') == '0' or 'retry-after' in headers or 'rate limit' in message.lower()
+
+
+class RateLimiter(object):
+    """
+    Tracks the rate limit budget of a token from the response headers and spaces out the
+    requests so that the budget lasts until the reset; it's shared by all the threads of
+    a synchronization
+    """
+
+    def __init__(self, remaining=None, reset=None, sleep=time.sleep):
+        """
+        :param remaining: requests left in the current window, None if unknown
+        :param reset: aware datetime when the window resets
+        :param sleep: function used to wait
+        """
+        self.remaining = remaining
+        self.reset = calendar.timegm(reset.utctimetuple()) if reset else None
+        self.sleep = sleep
+        self.limit = None
+        self.next_request = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_token(cls, token, **kwargs):
+        return cls(token.rate_limit_remaining, token.rate_limit_reset, **kwargs)
+
+    @property
+    def reset_datetime(self):
+        if self.reset is None:
+            return None
+        return datetime.fromtimestamp(self.reset, timezone.utc)
+
+    def acquire(self):
+        """
+        wait for the turn of the next request; raise RateLimitParked when the budget is
+        exhausted for longer than settings.SYNC_RATE_LIMIT_MAX_WAIT seconds
+        """
+        with self.lock:
+            now = time.time()
+            if self.remaining is None or self.reset is None or self.reset <= now:
+                return
+
+            if self.remaining <= 0:
+                wait = self.reset - now
+                if wait > settings.SYNC_RATE_LIMIT_MAX_WAIT:
+                    raise RateLimitParked(self.reset_datetime)
+                logger.info('rate limit exhausted, waiting %.1fs for the reset' % wait)
+                self.sleep(wait)
+                return
+
+            # below the low-water mark spread the remaining requests until the reset
+            if self.limit and self.remaining < self.limit * settings.SYNC_RATE_LIMIT_PACING:
+                slot = max(now, self.next_request)
+                self.next_request = slot + (self.reset - now) / self.remaining
+                self.remaining -= 1
+                if slot > now:
+                    self.sleep(slot - now)
+
+    def update(self, headers):
+        """
+        read the budget from the headers of a response
+        """
+        with self.lock:
+            if 'x-ratelimit-remaining' in headers:
+                self.remaining = int(headers['x-ratelimit-remaining'])
+            if 'x-ratelimit-limit' in headers:
+                self.limit = int(headers['x-ratelimit-limit'])
+            if 'x-ratelimit-reset' in headers:
+                self.reset = int(headers['x-ratelimit-reset'])
+
+    def backoff(self, attempt, headers):
+        """
+        wait before retrying a request refused by the rate limit: the Retry-After header
+        is honoured, otherwise the delay grows exponentially with a random jitter
+        """
+        if headers.get('x-ratelimit-remaining') == '0':
+            # the primary budget is exhausted, acquire() waits for the reset
+            return
+        if 'retry-after' in headers:
+            delay = int(headers['retry-after'])
+        else:
+            delay = min(settings.SYNC_BACKOFF_MAX, settings.SYNC_BACKOFF_BASE * 2 ** attempt)
+            delay = random.uniform(delay / 2, delay)
+        logger.info('secondary rate limit hit, retrying in %.1fs' % delay)
+        self.sleep(delay)
+
+    def save(self, token):
+        """
+        store the budget on the token for the next synchronizations
+        """
+        token.rate_limit_remaining = self.remaining
+        token.rate_limit_reset = self.reset_datetime
+        Token.objects.filter(pk=token.pk).update(rate_limit_remaining=token.rate_limit_remaining,
+                                                 rate_limit_reset=token.rate_limit_reset)
@@ -0,0 +1,207 @@
+import logging
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from provider.models import CacheValidator, DeployKey, Repository
+
+logger = logging.getLogger()
+
+# fields of a repository that can change between two synchronizations
+REPOSITORY_FIELDS = ('organization', 'is_private', 'is_user_admin')
+
+Changes = namedtuple('Changes', ['created', 'updated', 'deleted'])
+
+
+def chunked(items, size=None):
+    """
+    split a list in consecutive slices of at most `size` elements
+    :param items: list to split
+    :param size: slice length, defaults to settings.SYNC_CHUNK_SIZE
+    """
+    size = size or settings.SYNC_CHUNK_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bulk_update(model, objects, fields):
+    """
+    update `fields` of the given instances grouping together the rows that share
+    the same new values, so that each group costs a single UPDATE ... WHERE id IN
+    (Django 1.10 has no QuerySet.bulk_update)
+    """
+    groups = defaultdict(list)
+    for obj in objects:
+        groups[tuple(getattr(obj, field) for field in fields)].append(obj.pk)
+    for values, pks in groups.items():
+        model.objects.filter(pk__in=pks).update(**dict(zip(fields, values)))
+
+
+def apply_changes(model, to_create, to_update, fields, to_delete):
+    """
+    write the result of a diff: inserts, updates and deletes are applied in chunks,
+    each chunk in its own transaction
+    """
+    for chunk in chunked(to_create):
+        with transaction.atomic():
+            model.objects.bulk_create(chunk)
+    for chunk in chunked(to_update):
+        with transaction.atomic():
+            bulk_update(model, chunk, fields)
+    for chunk in chunked(to_delete):
+        with transaction.atomic():
+            model.objects.filter(pk__in=chunk).delete()
+    return Changes(len(to_create), len(to_update), len(to_delete))
+
+
+def stored_repositories(queryset):
+    """
+    load the stored repositories indexed by their natural key
+    :param queryset: repositories of a user and a provider
+    :return: dict (owner, name) -> Repository
+    """
+    matches = defaultdict(list)
+    for repository in queryset:
+        matches[(repository.owner, repository.name)].append(repository)
+
+    existing = {}
+    for natural_key, rows in matches.items():
+        if len(rows) > 1:
+            logger.error('More than 1 Repository with this params: %s ' % (natural_key,))
+            raise Repository.MultipleObjectsReturned(
+                'get() returned more than one Repository -- it returned %s!' % len(rows))
+        existing[natural_key] = rows[0]
+    return existing
+
+
+def reconcile_page(user, provider, page, repositories):
+    """
+    align the user's repositories stored in the database with a page of the listing; the
+    repositories that were on this page and are no more are detached from it, so that
+    finish_listing() deletes them unless another page lists them
+    :param user: owner of the synchronization
+    :param provider: provider the listing comes from
+    :param page: number of the listing page
+    :param repositories: list of dicts with the Repository fields of each repository
+    :return: tuple (repositories of the page indexed by (owner, name), Changes)
+    """
+    queryset = Repository.objects.filter(user=user, provider=provider)
+    existing = stored_repositories(queryset.filter(name__in={params['name'] for params in repositories}))
+
+    fields = REPOSITORY_FIELDS + ('listing_page',)
+    to_create, to_update, seen = [], [], {}
+    for params in repositories:
+        natural_key = (params['owner'], params['name'])
+        params = dict(params, listing_page=page)
+        repository = existing.get(natural_key)
+        if repository is None:
+            repository = Repository(user=user, provider=provider, **params)
+            to_create.append(repository)
+        elif any(getattr(repository, field) != params[field] for field in fields):
+            for field in fields:
+                setattr(repository, field, params[field])
+            to_update.append(repository)
+        seen[natural_key] = repository
+
+    changes = apply_changes(Repository, to_create, to_update, fields, [])
+    queryset.filter(listing_page=page).exclude(pk__in=[repository.pk for repository in seen.values()]).update(
+        listing_page=None)
+    return seen, changes
+
+
+def finish_listing(user, provider, last_page):
+    """
+    complete the synchronization of the listing: the repositories no page listed are
+    deleted, and so are the deploy keys of the repositories the user is no more admin of
+    :param last_page: number of the last page of the listing
+    :return: Changes of the repositories
+    """
+    repositories = Repository.objects.filter(user=user, provider=provider)
+    to_delete = repositories.filter(Q(listing_page__isnull=True) | Q(listing_page__gt=last_page))
+    keys = DeployKey.objects.filter(repository__in=repositories.filter(is_user_admin=False))
+    apply_changes(DeployKey, [], [], (), list(keys.values_list('pk', flat=True)))
+    return apply_changes(Repository, [], [], (), list(to_delete.values_list('pk', flat=True)))
+
+
+def reconcile_keys(repositories, keys):
+    """
+    align the deploy keys stored in the database with the keys read from the provider:
+    keys are matched by their github id, or by repository and fingerprint when the stored
+    key has no id yet, so that only new, changed and removed keys are written
+    :param repositories: Repository of each key of `keys`, indexed by (owner, name)
+    :param keys: dict (owner, name) -> list of dicts with the DeployKey fields of each deploy key,
+                 or None to keep the stored keys
+    :return: Changes
+    """
+    changed = [repositories[natural_key].pk for natural_key, repository_keys in keys.items()
+               if repository_keys is not None]
+    if not changed:
+        return Changes(0, 0, 0)
+
+    existing, by_id, by_fingerprint = set(), {}, {}
+    for deploy_key in DeployKey.objects.filter(repository__in=changed):
+        existing.add(deploy_key.pk)
+        if deploy_key.github_id is not None:
+            by_id[deploy_key.github_id] = deploy_key
+        else:
+            by_fingerprint.setdefault((deploy_key.repository_id, deploy_key.fingerprint), deploy_key)
+
+    to_create, to_update, seen = [], [], set()
+    for natural_key, repository_keys in keys.items():
+        repository = repositories[natural_key]
+        for params in repository_keys or ():
+            if params['github_id'] in seen:
+                continue
+            seen.add(params['github_id'])
+
+            deploy_key = by_id.get(params['github_id'])
+            if deploy_key is None or deploy_key.repository_id != repository.pk:
+                deploy_key = by_fingerprint.pop((repository.pk, params['fingerprint']), None)
+            if deploy_key is None:
+                to_create.append(DeployKey(repository=repository, **params))
+                continue
+
+            existing.discard(deploy_key.pk)
+            if (deploy_key.title, deploy_key.github_id) != (params['title'], params['github_id']):
+                deploy_key.title, deploy_key.github_id = params['title'], params['github_id']
+                to_update.append(deploy_key)
+
+    # what is left of the stored keys is no more on the provider
+    return apply_changes(DeployKey, to_create, to_update, ('title', 'github_id'), sorted(existing))
+
+
+def save_validators(token, validators):
+    """
+    store the validators received for some resources
+    :param token: token used for the synchronization
+    :param validators: dict url -> (etag, last modified)
+    :return: Changes
+    """
+    if not validators:
+        return Changes(0, 0, 0)
+    existing = {validator.url: validator
+                for validator in CacheValidator.objects.filter(token=token, url__in=list(validators))}
+
+    to_create, to_update = [], []
+    for url, (etag, last_modified) in validators.items():
+        validator = existing.get(url)
+        if validator is None:
+            to_create.append(CacheValidator(token=token, url=url, etag=etag, last_modified=last_modified))
+        elif (validator.etag, validator.last_modified) != (etag, last_modified):
+            validator.etag, validator.last_modified = etag, last_modified
+            to_update.append(validator)
+    return apply_changes(CacheValidator, to_create, to_update, ('etag', 'last_modified'), [])
+
+
+def prune_validators(token, resources, urls):
+    """
+    remove the validators of the resources that are no more synchronized
+    :param resources: resources to keep, with their query string
+    :param urls: urls whose resources are kept whatever their query string
+    :return: Changes
+    """
+    to_delete = [pk for pk, url in CacheValidator.objects.filter(token=token).values_list('pk', 'url')
+                 if url not in resources and url.split('?')[0] not in urls]
+    return apply_changes(CacheValidator, [], [], (), to_delete)
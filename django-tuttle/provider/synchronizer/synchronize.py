@@ -1,10 +1,19 @@
 import logging
 
+from django.conf import settings
+from django.db import transaction
 from github import BadCredentialsException
 from github import Github
 from github import GithubException
 
-from provider.models import Token, DeployKey, Repository
+from provider.models import CacheValidator, Repository, Token
+from provider.synchronizer.checkpoint import finish_run, start_run
+from provider.synchronizer.client import (GithubClient, LISTING_URL, PER_PAGE, keys_url, listing_parameters,
+                                          repository_params, resource)
+from provider.synchronizer.keys import fetch_keys
+from provider.synchronizer.ratelimit import RateLimiter
+from provider.synchronizer.reconcile import (finish_listing, prune_validators, reconcile_keys, reconcile_page,
+                                             save_validators, stored_repositories)
 
 logger = logging.getLogger()
 
@@ -20,10 +29,26 @@ def synchronize(user):
     except Token.DoesNotExist:
         raise
 
+    limiter = RateLimiter.for_token(token)
+    try:
+        synchronize_token(token, limiter)
+    finally:
+        # the budget left is used by the next synchronizations of the token
+        limiter.save(token)
+
+
+def synchronize_token(token, limiter):
+    """
+    synchronize the repositories and deploy keys visible with a token
+    :param token: Token of the user
+    :param limiter: RateLimiter tracking the token's budget
+    """
+    # a token whose budget is exhausted is parked until the reset
+    limiter.acquire()
     try:
         # login on github account using user's token
         logger.info('logging on github')
-        login = Github(token.token)
+        login = Github(token.token, base_url=settings.GITHUB_API_URL, per_page=PER_PAGE)
 
     except BadCredentialsException:
         logger.error('Invalid credentials')
@@ -32,36 +57,100 @@ def synchronize(user):
     current_user = login.get_user()
 
     # check token scopes
+    limiter.update(current_user.raw_headers)
     scope_list = current_user.raw_headers['x-oauth-scopes']
     if 'repo' not in scope_list:
         logger.info('no "repo" attribute for the current token')
         raise GithubException('', '')
-    # delete user's deploy keys
-    DeployKey.objects.filter(repository__user=token.user).delete()
-    # get repository info of the logged user
-    for repo in current_user.get_repos():
-        params = {
-            'name': repo.name,
-            'owner': repo.owner.login,
-            'organization': getattr(repo.organization, 'name', None),
-            'is_private': repo.private,
-            'is_user_admin': repo.permissions.admin,
-            'user': token.user,
-            'provider': token.provider,
-        }
-        try:
-            Repository.objects.get_or_create(**params)
-
-        except Repository.MultipleObjectsReturned:
-            msg = 'More than 1 Repository with this params: %s ' % params
-            logger.error(msg)
-            raise
-        # user must be admin of his repository for get the deploy keys
-        if repo.permissions.admin:
-            for key in repo.get_keys():
-                params = {
-                    'title': key.title,
-                    'key': key.key,
-                    'repository': Repository.objects.get(name=repo.name),
-                }
-                DeployKey.objects.create(**params)
+
+    validators = {
+        validator.url: (validator.etag, validator.last_modified)
+        for validator in CacheValidator.objects.filter(token=token)
+    }
+    client = GithubClient(current_user._requester, validators, limiter)
+
+    # every step is written with its checkpoint, an interrupted run resumes from it
+    state = start_run(token.user)
+    if not state.listing_done:
+        synchronize_listing(token, state, client)
+    synchronize_keys(token, state, client)
+
+    admin_urls = {keys_url(owner, name) for owner, name in Repository.objects.filter(
+        user=token.user, provider=token.provider, is_user_admin=True).values_list('owner', 'name')}
+    listing_resources = {resource(LISTING_URL, listing_parameters(page)) for page in range(1, state.listing_page + 1)}
+    prune_validators(token, listing_resources, admin_urls)
+    finish_run(state)
+
+
+def synchronize_listing(token, state, client):
+    """
+    write the repositories listing one page at a time, each page together with its
+    validators and the checkpoint
+    :param state: SyncState of the run
+    """
+    start = state.listing_page or 1
+    page = start
+    for page, data in client.listing(start):
+        if start > 1 and page == start and data is not None:
+            # the last page written before the interruption changed, so the listing shifted:
+            # it's walked again from the first page, whose unchanged pages answer 304
+            logger.info('repositories listing changed since the interruption, starting from the first page')
+            state.listing_page = 0
+            return synchronize_listing(token, state, client)
+
+        with transaction.atomic():
+            if data is not None:
+                _, changes = reconcile_page(token.user, token.provider, page,
+                                            [repository_params(params) for params in data])
+                logger.info('repositories page %s synchronized: %s' % (page, changes))
+                save_validators(token, client.pop_responses(resource(LISTING_URL, listing_parameters(page))))
+            state.listing_page = page
+            state.save(update_fields=['listing_page'])
+
+    with transaction.atomic():
+        changes = finish_listing(token.user, token.provider, page)
+        logger.info('repositories listing synchronized on %s pages, %s deleted' % (page, changes.deleted))
+        state.listing_done = True
+        state.save(update_fields=['listing_done'])
+
+
+def synchronize_keys(token, state, client):
+    """
+    fetch the deploy keys of the admin repositories that were not fetched yet during the run;
+    they are written in chunks, each with the validators of its resources and the checkpoint
+    :param state: SyncState of the run
+    """
+    # user must be admin of his repository for get the deploy keys
+    repositories = stored_repositories(Repository.objects.filter(
+        user=token.user, provider=token.provider, is_user_admin=True).exclude(keys_run=state.run))
+
+    fetched = {}
+    try:
+        for natural_key, keys in fetch_keys(client, list(repositories)):
+            fetched[natural_key] = keys
+            if len(fetched) == settings.SYNC_CHUNK_SIZE:
+                write_keys(token, state, client, repositories, fetched)
+                fetched = {}
+    finally:
+        # the keys fetched before an error are kept, the resumed run doesn't fetch them again
+        write_keys(token, state, client, repositories, fetched)
+
+
+def write_keys(token, state, client, repositories, keys):
+    """
+    write a chunk of deploy keys and mark their repositories as done for the run
+    :param repositories: Repository of each key of `keys`, indexed by (owner, name)
+    :param keys: dict (owner, name) -> list of deploy keys, None when unchanged
+    """
+    if not keys:
+        return
+    validators = {}
+    for owner, name in keys:
+        validators.update(client.pop_responses(keys_url(owner, name)))
+
+    with transaction.atomic():
+        changes = reconcile_keys(repositories, keys)
+        Repository.objects.filter(pk__in=[repositories[natural_key].pk for natural_key in keys]).update(
+            keys_run=state.run)
+        save_validators(token, validators)
+    logger.info('deploy keys of %s repositories synchronized: %s' % (len(keys), changes))
@@ -0,0 +1,15 @@
+import pytest
+
+from provider.tests.fake_github import FakeGithub
+
+
+@pytest.fixture
+def github(settings):
+    """
+    fake github api the synchronizer talks to
+    """
+    fake = FakeGithub()
+    fake.start()
+    settings.GITHUB_API_URL = fake.url
+    yield fake
+    fake.stop()
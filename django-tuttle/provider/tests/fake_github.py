@@ -0,0 +1,150 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class FakeGithubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeGithubHandler(BaseHTTPRequestHandler):
+    """
+    Serves the subset of the github rest api used by the synchronizer
+    """
+    routes = [
+        (re.compile(r'^/user$'), 'user'),
+        (re.compile(r'^/user/repos$'), 'repositories'),
+        (re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<name>[^/]+)/keys$'), 'keys'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        github = self.server.github
+        url = urlparse(self.path)
+        parameters = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if self.headers.get('Authorization') not in {'token %s' % token for token in github.tokens}:
+            return self.respond(401, {'message': 'Bad credentials'})
+        with github.lock:
+            secondary_limited = github.secondary_limited > 0
+            github.secondary_limited -= secondary_limited
+        if secondary_limited:
+            return self.respond(403, {'message': 'You have exceeded a secondary rate limit'}, {'Retry-After': '0'})
+        if github.remaining <= 0:
+            return self.respond(403, {'message': 'API rate limit exceeded'})
+
+        for pattern, route in self.routes:
+            match = pattern.match(url.path)
+            if match:
+                kwargs = {key: unquote(value) for key, value in match.groupdict().items()}
+                return getattr(self, route)(url.path, parameters, **kwargs)
+        return self.respond(404, {'message': 'Not Found'})
+
+    def user(self, path, parameters):
+        self.respond(200, {'login': self.server.github.login, 'id': 1}, {'X-OAuth-Scopes': self.server.github.scopes})
+
+    def repositories(self, path, parameters):
+        self.paginate(path, parameters, self.server.github.repositories)
+
+    def keys(self, path, parameters, owner, name):
+        keys = self.server.github.keys.get((owner, name))
+        if keys is None:
+            return self.respond(404, {'message': 'Not Found'})
+        self.paginate(path, parameters, keys)
+
+    def paginate(self, path, parameters, items):
+        per_page = int(parameters.get('per_page', 30))
+        page = int(parameters.get('page', 1))
+        headers = {}
+        if page * per_page < len(items):
+            headers['Link'] = '<%s%s?per_page=%s&page=%s>; rel="next"' % (
+                self.server.github.url, path, per_page, page + 1)
+        self.respond(200, items[(page - 1) * per_page:page * per_page], headers)
+
+    def respond(self, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        headers = dict(headers or {})
+        github = self.server.github
+        if status == 200:
+            headers['ETag'] = '"%s"' % hashlib.sha1(body + headers.get('Link', '').encode('utf-8')).hexdigest()
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                status, body = 304, b''
+        with github.lock:
+            # conditional requests answered with 304 don't cost rate limit
+            if status == 200:
+                github.remaining -= 1
+            github.requests.append((self.command, self.path, status))
+            headers.update({
+                'X-RateLimit-Limit': str(github.rate_limit),
+                'X-RateLimit-Remaining': str(max(github.remaining, 0)),
+                'X-RateLimit-Reset': str(github.reset),
+            })
+
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeGithub(object):
+    """
+    In-memory github account served over http on localhost
+    """
+
+    def __init__(self, token='123456', scopes='repo', login='user test'):
+        self.token = token
+        # every token accepted by the server
+        self.tokens = {token}
+        self.scopes = scopes
+        self.login = login
+        self.repositories = []
+        self.keys = {}
+        # (method, path, status) of every request received
+        self.requests = []
+        self.rate_limit = self.remaining = 5000
+        self.reset = int(time.time()) + 3600
+        # number of the next requests refused by the secondary rate limit
+        self.secondary_limited = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self.server.server_address
+
+    def add_repository(self, name, owner='user test', organization=False, private=False, admin=True):
+        repository = {
+            'id': len(self.repositories) + 1,
+            'name': name,
+            'full_name': '%s/%s' % (owner, name),
+            'owner': {'login': owner, 'type': 'Organization' if organization else 'User'},
+            'private': private,
+            'permissions': {'admin': admin, 'push': admin, 'pull': True},
+        }
+        self.repositories.append(repository)
+        self.keys[(owner, name)] = []
+        return repository
+
+    def add_key(self, repository, title, key):
+        deploy_key = {'id': sum(len(keys) for keys in self.keys.values()) + 1, 'title': title, 'key': key}
+        self.keys[(repository['owner']['login'], repository['name'])].append(deploy_key)
+        return deploy_key
+
+    def start(self):
+        self.server = FakeGithubServer(('127.0.0.1', 0), FakeGithubHandler)
+        self.server.github = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
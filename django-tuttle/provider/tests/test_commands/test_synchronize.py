@@ -1,134 +1,68 @@
 import pytest
 
+from io import StringIO
 from django.contrib.auth import get_user_model
 from django.core.management import CommandError
 from django.core.management import call_command
 from github import BadCredentialsException
-from github import GithubException
+from github import GithubException, UnknownObjectException
 from github.Repository import Repository as GithubRepo
-from provider.models import Provider, Repository, DeployKey, Token
+from provider.models import CacheValidator, Provider, Repository, DeployKey, SyncState, Token
 from unittest.mock import MagicMock, patch
 
 
 @pytest.mark.django_db
-def test_fetch_repositories_with_organization_field():
+def test_fetch_repositories_with_organization_field(github):
     """
     Test the correct creation of Repository object with organization field
     """
-    with patch('provider.synchronizer.synchronize.Github') as githubMock:
-        github_user_mock = MagicMock()
-        github_repo_mock = MagicMock(GithubRepo)
-
-        # assignement scope to user's token
-        github_user_mock.raw_headers = {'x-oauth-scopes': 'repo'}
-
-        # assignment parameters for the creation of Repository object
-        github_repo_mock.name = 'test'
-        github_repo_mock.organization.name = 'test-organization'
-        github_repo_mock.owner.login = 'user test'
-        github_repo_mock.private = False
-        github_repo_mock.permissions.admin = True
-
-        # mock get_repos() method
-        githubMock = githubMock.return_value
-        githubMock.get_user = MagicMock(return_value=github_user_mock)
-        github_user_mock.get_repos = MagicMock(return_value=[github_repo_mock])
-
-        # creation of arguments needed for execute the django command
-        token_arg = '123456'
-        provider_arg = 'test'
+    github.add_repository('test', owner='test-organization', organization=True)
 
-        # creation of objects User, Provider, Token
-        user = get_user_model().objects.create(username='username', email='test@test.it')
-        provider = Provider.objects.create(name=provider_arg)
-        Token.objects.create(title='test', token=token_arg, provider=provider, user=user)
-        call_command('fetch_repositories', '-u', user)
-        assert Repository.objects.count() == 1
+    # creation of objects User, Provider, Token
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    call_command('fetch_repositories', '-u', user)
+    assert Repository.objects.count() == 1
+    assert Repository.objects.get(name='test').organization == 'test-organization'
 
 
 @pytest.mark.django_db
-def test_fetch_repositories_with_empty_organization_field():
+def test_fetch_repositories_with_empty_organization_field(github):
     """
     Test the correct creation of Repository object with empty organization field
     """
-    with patch('provider.synchronizer.synchronize.Github') as githubMock:
-        github_user_mock = MagicMock()
-        github_repo_mock = MagicMock(GithubRepo)
-
-        # assignement scope to user's token
-        github_user_mock.raw_headers = {'x-oauth-scopes': 'repo'}
+    github.add_repository('test')
 
-        # assignment parameters for the creation of Repository object
-        github_repo_mock.name = 'test'
-        github_repo_mock.organization = None
-        github_repo_mock.owner.login = 'user test'
-        github_repo_mock.private = False
-        github_repo_mock.permissions.admin = True
-
-        # mock get_repos() method
-        githubMock = githubMock.return_value
-        githubMock.get_user = MagicMock(return_value=github_user_mock)
-        github_user_mock.get_repos = MagicMock(return_value=[github_repo_mock])
-
-        # creation of arguments needed for execute the django command
-        token_arg = '123456'
-        provider_arg = 'test'
-
-        # creation of object User, Provider, Token
-        user = get_user_model().objects.create(username='username', email='test@test.it')
-        provider = Provider.objects.create(name=provider_arg)
-        Token.objects.create(title='test', token=token_arg, provider=provider, user=user)
+    # creation of object User, Provider, Token
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
 
-        call_command('fetch_repositories', '-u', user)
-        repository = Repository.objects.get(name='test')
+    call_command('fetch_repositories', '-u', user)
+    repository = Repository.objects.get(name='test')
 
-        assert Repository.objects.count() == 1
-        assert repository.organization is None
+    assert Repository.objects.count() == 1
+    assert repository.organization is None
 
 
 @pytest.mark.django_db
-def test_fetch_repositories_get_deploykey():
+def test_fetch_repositories_get_deploykey(github):
     """
     Test the correct creation of Deploy key object
     """
-    with patch('provider.synchronizer.synchronize.Github') as githubMock:
-        github_user_mock = MagicMock()
-        github_repo_mock = MagicMock(GithubRepo)
+    repository = github.add_repository('test')
+    github.add_key(repository, 'test key', '123456')
 
-        # assignement scope to user's token
-        github_user_mock.raw_headers = {'x-oauth-scopes': 'repo'}
-
-        # assignment parameters for the creation of Repository object
-        github_repo_mock.name = 'test'
-        github_repo_mock.organization = None
-        github_repo_mock.owner.login = 'user test'
-        github_repo_mock.private = False
-        github_repo_mock.permissions.admin = True
-
-        # mock methods
-        githubMock = githubMock.return_value
-        githubMock.get_user = MagicMock(return_value=github_user_mock)
-        github_user_mock.get_repos = MagicMock(return_value=[github_repo_mock])
-        github_repo_mock.get_keys = MagicMock(return_value=[github_repo_mock])
-
-        # assignment parameters for create deploy key object
-        github_repo_mock.permissions.admin = True
-        github_repo_mock.title = 'test key'
-        github_repo_mock.key = '123456'
-
-        # creation of arguments needed for execute the django command
-        token_arg = '123456'
-        provider_arg = 'test'
-
-        # creation of objects TuttleUser and Provider
-        user = get_user_model().objects.create(username='username', email='test@test.it')
-        provider = Provider.objects.create(name=provider_arg)
-        Token.objects.create(title='test', token=token_arg, provider=provider, user=user)
-        call_command('fetch_repositories', '-u', user)
-        key = DeployKey.objects.get(title='test key')
-        assert DeployKey.objects.count() == 1
-        assert key.title == 'test key'
-        assert key.key == '123456'
+    # creation of objects TuttleUser and Provider
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    call_command('fetch_repositories', '-u', user)
+    key = DeployKey.objects.get(title='test key')
+    assert DeployKey.objects.count() == 1
+    assert key.title == 'test key'
+    assert key.key == '123456'
 
 
 @pytest.mark.django_db
@@ -146,7 +80,7 @@ def test_fetch_repositories_with_no_user_object():
 
     with pytest.raises(CommandError) as ex:
         call_command('fetch_repositories')
-    assert 'Error: the following arguments are required: -u/--user' in str(ex.value)
+    assert 'Error: one of the arguments -u/--user --all --users-from is required' in str(ex.value)
 
 
 @pytest.mark.django_db
@@ -179,85 +113,43 @@ def test_fetch_repositories_with_invalid_token():
 
 
 @pytest.mark.django_db
-def test_fetch_repositories_organization_multiple_objects_returned():
-    with patch('provider.synchronizer.synchronize.Github') as githubMock:
-        github_user_mock = MagicMock()
-        github_repo_mock = MagicMock(GithubRepo)
+def test_fetch_repositories_organization_multiple_objects_returned(github):
+    github.add_repository('test', owner='test organization', organization=True)
 
-        # assignement scope to user's token
-        github_user_mock.raw_headers = {'x-oauth-scopes': 'repo'}
-
-        # assignment parameters for the creation of Repository object
-        github_repo_mock.name = 'test'
-        github_repo_mock.organization.name = 'test organization'
-        github_repo_mock.owner.login = 'user test'
-        github_repo_mock.private = False
-        github_repo_mock.permissions.admin = True
-
-        # mock get_repos() method
-        githubMock = githubMock.return_value
-        githubMock.get_user = MagicMock(return_value=github_user_mock)
-        github_user_mock.get_repos = MagicMock(return_value=[github_repo_mock])
-
-        # creation of arguments needed for execute the django command
-        token_arg = '123456'
-        provider_arg = 'test'
-
-        # creation of object User, Provider, Token
-        user = get_user_model().objects.create(username='username', email='test@test.it')
-        provider = Provider.objects.create(name=provider_arg)
-        Token.objects.create(title='test', token=token_arg, provider=provider, user=user)
+    # creation of object User, Provider, Token
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
 
-        Repository.objects.create(name='test', owner='user test', organization='test organization',
-                                  is_private=False, is_user_admin=True, user=user, provider=provider)
+    Repository.objects.create(name='test', owner='test organization', organization='test organization',
+                              is_private=False, is_user_admin=True, user=user, provider=provider)
 
-        Repository.objects.create(name='test', owner='user test', organization='test organization',
-                                  is_private=False, is_user_admin=True, user=user, provider=provider)
+    Repository.objects.create(name='test', owner='test organization', organization='test organization',
+                              is_private=False, is_user_admin=True, user=user, provider=provider)
 
-        with pytest.raises(Repository.MultipleObjectsReturned) as ex:
-            call_command('fetch_repositories', '-u', user)
-        assert 'get() returned more than one Repository -- it returned 2!' in str(ex.value)
+    with pytest.raises(Repository.MultipleObjectsReturned) as ex:
+        call_command('fetch_repositories', '-u', user)
+    assert 'get() returned more than one Repository -- it returned 2!' in str(ex.value)
 
 
 @pytest.mark.django_db
-def test_fetch_repositories_without_organization_multiple_objects_returned():
-    with patch('provider.synchronizer.synchronize.Github') as githubMock:
-        github_user_mock = MagicMock()
-        github_repo_mock = MagicMock(GithubRepo)
-
-        # assignement scope to user's token
-        github_user_mock.raw_headers = {'x-oauth-scopes': 'repo'}
-
-        # assignment parameters for the creation of Repository object
-        github_repo_mock.name = 'test'
-        github_repo_mock.organization = None
-        github_repo_mock.owner.login = 'user test'
-        github_repo_mock.private = False
-        github_repo_mock.permissions.admin = True
+def test_fetch_repositories_without_organization_multiple_objects_returned(github):
+    github.add_repository('test')
 
-        # mock get_repos() method
-        githubMock = githubMock.return_value
-        githubMock.get_user = MagicMock(return_value=github_user_mock)
-        github_user_mock.get_repos = MagicMock(return_value=[github_repo_mock])
-
-        # creation of arguments needed for execute the django command
-        token_arg = '123456'
-        provider_arg = 'test'
-
-        # creation of object User, Provider, Token
-        user = get_user_model().objects.create(username='username', email='test@test.it')
-        provider = Provider.objects.create(name=provider_arg)
-        Token.objects.create(title='test', token=token_arg, provider=provider, user=user)
+    # creation of object User, Provider, Token
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
 
-        Repository.objects.create(name='test', owner='user test', is_private=False, is_user_admin=True,
-                                  user=user, provider=provider)
+    Repository.objects.create(name='test', owner='user test', is_private=False, is_user_admin=True,
+                              user=user, provider=provider)
 
-        Repository.objects.create(name='test', owner='user test', is_private=False, is_user_admin=True,
-                                  user=user, provider=provider)
+    Repository.objects.create(name='test', owner='user test', is_private=False, is_user_admin=True,
+                              user=user, provider=provider)
 
-        with pytest.raises(Repository.MultipleObjectsReturned) as ex:
-            call_command('fetch_repositories', '-u', user)
-        assert 'get() returned more than one Repository -- it returned 2!' in str(ex.value)
+    with pytest.raises(Repository.MultipleObjectsReturned) as ex:
+        call_command('fetch_repositories', '-u', user)
+    assert 'get() returned more than one Repository -- it returned 2!' in str(ex.value)
 
 
 @pytest.mark.django_db
@@ -303,3 +195,267 @@ def test_fetch_repositories_token_does_not_exist():
     with pytest.raises(Token.DoesNotExist) as ex:
         call_command('fetch_repositories', '-u', user)
     assert 'Token matching query does not exist.' in str(ex.value)
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_not_modified(github):
+    """
+    Test that a second synchronization sends conditional requests and skips the unchanged resources
+    """
+    for i in range(150):
+        repository = github.add_repository('repo-%s' % i, admin=i < 3)
+        github.add_key(repository, 'key %s' % i, 'key-%s' % i)
+
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    token = Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    call_command('fetch_repositories', '-u', user)
+    assert Repository.objects.count() == 150
+    assert DeployKey.objects.count() == 3
+    assert CacheValidator.objects.filter(token=token).count() == 5
+
+    del github.requests[:]
+    call_command('fetch_repositories', '-u', user)
+    assert Repository.objects.count() == 150
+    assert DeployKey.objects.count() == 3
+    assert [status for method, path, status in github.requests if path != '/user'] == [304] * 5
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_modified_page(github):
+    """
+    Test that the listing pages shifted by a deleted repository are read again
+    """
+    for i in range(150):
+        github.add_repository('repo-%s' % i, admin=False)
+    repository = github.add_repository('with keys')
+    github.add_key(repository, 'key', 'key')
+
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    call_command('fetch_repositories', '-u', user)
+
+    del github.repositories[0]
+    github.add_key(repository, 'new key', 'new key')
+    del github.requests[:]
+    call_command('fetch_repositories', '-u', user)
+
+    assert Repository.objects.count() == 150
+    assert not Repository.objects.filter(name='repo-0').exists()
+    assert DeployKey.objects.count() == 2
+    assert [status for method, path, status in github.requests if path != '/user'] == [200] * 3
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_keeps_deploykey_rows(github):
+    """
+    Test that the deploy keys still present on github keep their rows between two synchronizations
+    """
+    repository = github.add_repository('test')
+    github.add_key(repository, 'kept', 'kept')
+    removed = github.add_key(repository, 'removed', 'removed')
+
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    call_command('fetch_repositories', '-u', user)
+    kept = DeployKey.objects.get(title='kept')
+
+    github.keys[('user test', 'test')].remove(removed)
+    github.keys[('user test', 'test')][0]['title'] = 'renamed'
+    call_command('fetch_repositories', '-u', user)
+
+    assert list(DeployKey.objects.values_list('pk', 'title')) == [(kept.pk, 'renamed')]
+
+
+def create_users(github, count):
+    provider = Provider.objects.create(name='test')
+    users = []
+    for i in range(count):
+        user = get_user_model().objects.create(username='user-%s' % i, email='user-%s@test.it' % i)
+        Token.objects.create(title='test', token='token-%s' % i, provider=provider, user=user)
+        users.append(user)
+        github.tokens.add('token-%s' % i)
+    github.add_repository('test')
+    return users
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_all_users(github):
+    """
+    Test the synchronization of every user with a token, reporting each outcome
+    """
+    users = create_users(github, 2)
+    get_user_model().objects.create(username='without token', email='test@test.it')
+    github.tokens.remove('token-1')
+    out = StringIO()
+
+    with pytest.raises(CommandError) as ex:
+        call_command('fetch_repositories', '--all', '--workers', '1', stdout=out)
+
+    assert '1 users failed to synchronize' in str(ex.value)
+    assert 'user-0: synchronized in' in out.getvalue()
+    assert 'user-1: failed in' in out.getvalue()
+    assert 'BadCredentialsException' in out.getvalue()
+    assert '1 users synchronized, 0 parked, 1 failed in' in out.getvalue()
+    assert 'without token' not in out.getvalue()
+    assert Repository.objects.filter(user=users[0]).count() == 1
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_users_from_file(github, tmpdir):
+    """
+    Test the synchronization of the users listed in a file
+    """
+    users = create_users(github, 3)
+    users_file = tmpdir.join('users.txt')
+    users_file.write('# users to synchronize\nuser-0\n\nuser-2\n')
+    out = StringIO()
+
+    call_command('fetch_repositories', '--users-from', str(users_file), '--workers', '1', stdout=out)
+
+    assert '2 users synchronized, 0 parked, 0 failed in' in out.getvalue()
+    assert Repository.objects.filter(user=users[1]).count() == 0
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_users_from_file_missing_user(github, tmpdir):
+    users_file = tmpdir.join('users.txt')
+    users_file.write('missing\n')
+
+    with pytest.raises(CommandError) as ex:
+        call_command('fetch_repositories', '--users-from', str(users_file))
+    assert 'User objects don\'t exist: missing' in str(ex.value)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fetch_repositories_all_users_process_pool(github):
+    """
+    Test the synchronization of many users on a pool of processes
+    """
+    users = create_users(github, 4)
+    out = StringIO()
+
+    call_command('fetch_repositories', '--all', '--workers', '2', stdout=out)
+
+    assert '4 users synchronized, 0 parked, 0 failed in' in out.getvalue()
+    for user in users:
+        assert Repository.objects.filter(user=user).count() == 1
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_rate_limit_exhausted(github):
+    """
+    Test that a token without budget is parked until the reset and its budget stored
+    """
+    github.add_repository('test')
+    github.remaining = 1
+
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    out = StringIO()
+    call_command('fetch_repositories', '-u', user, stdout=out)
+
+    assert 'username: rate limit exhausted, parked until' in out.getvalue()
+    token = Token.objects.get()
+    assert token.rate_limit_remaining == 0
+    assert token.rate_limit_reset.timestamp() == github.reset
+
+    # the next synchronization doesn't even try
+    del github.requests[:]
+    out = StringIO()
+    call_command('fetch_repositories', '--all', '--workers', '1', stdout=out)
+    assert 'username: parked until' in out.getvalue()
+    assert '0 users synchronized, 1 parked, 0 failed in' in out.getvalue()
+    assert github.requests == []
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_resume_listing(github):
+    """
+    Test that a synchronization interrupted during the listing resumes from the last page written
+    """
+    for i in range(250):
+        github.add_repository('repo-%s' % i, admin=False)
+    github.remaining = 3
+
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    call_command('fetch_repositories', '-u', user, stdout=StringIO())
+    assert Repository.objects.count() == 200
+    assert SyncState.objects.get(user=user).listing_page == 2
+
+    github.remaining = 5000
+    Token.objects.update(rate_limit_remaining=None)
+    del github.requests[:]
+    call_command('fetch_repositories', '-u', user)
+
+    assert Repository.objects.count() == 250
+    assert [(path, status) for method, path, status in github.requests if path != '/user'] == [
+        ('/user/repos?per_page=100&page=2', 304),
+        ('/user/repos?per_page=100&page=3', 200),
+    ]
+    state = SyncState.objects.get(user=user)
+    assert (state.run, state.listing_page, state.listing_done) == (1, 3, True)
+    assert state.finished_at is not None
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_resume_shifted_listing(github):
+    """
+    Test that a listing shifted during the interruption is walked again from the first page
+    """
+    for i in range(250):
+        github.add_repository('repo-%s' % i, admin=False)
+    github.remaining = 3
+
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    call_command('fetch_repositories', '-u', user, stdout=StringIO())
+
+    del github.repositories[0]
+    github.remaining = 5000
+    Token.objects.update(rate_limit_remaining=None)
+    call_command('fetch_repositories', '-u', user)
+
+    assert Repository.objects.count() == 249
+    assert not Repository.objects.filter(name='repo-0').exists()
+    assert sorted(Repository.objects.values_list('listing_page', flat=True).distinct()) == [1, 2, 3]
+
+
+@pytest.mark.django_db
+def test_fetch_repositories_resume_keys(github, settings):
+    """
+    Test that a synchronization interrupted while fetching the deploy keys only fetches the missing ones
+    """
+    settings.SYNC_KEY_WORKERS = 1
+    for i in range(5):
+        repository = github.add_repository('repo-%s' % i)
+        github.add_key(repository, 'key %s' % i, 'key-%s' % i)
+    keys = github.keys.pop(('user test', 'repo-3'))
+
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    provider = Provider.objects.create(name='test')
+    Token.objects.create(title='test', token=github.token, provider=provider, user=user)
+    with pytest.raises(UnknownObjectException):
+        call_command('fetch_repositories', '-u', user)
+    assert DeployKey.objects.count() == 3
+
+    github.keys[('user test', 'repo-3')] = keys
+    del github.requests[:]
+    call_command('fetch_repositories', '-u', user)
+
+    assert DeployKey.objects.count() == 5
+    assert [path for method, path, status in github.requests if path != '/user'] == [
+        '/repos/user%20test/repo-3/keys?per_page=100',
+        '/repos/user%20test/repo-4/keys?per_page=100',
+    ]
+    assert SyncState.objects.get(user=user).run == 1
+
+    # a completed run is followed by a new one
+    call_command('fetch_repositories', '-u', user)
+    assert SyncState.objects.get(user=user).run == 2
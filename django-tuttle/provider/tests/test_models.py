@@ -2,7 +2,7 @@ import pytest
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
 
-from ..models import Provider, Repository, DeployKey, Token
+from ..models import CacheValidator, Provider, Repository, DeployKey, Token
 
 
 @pytest.mark.django_db
@@ -103,3 +103,27 @@ class TestToken(object):
 
         with pytest.raises(IntegrityError):
             Token.objects.create(title='test', token='123456', provider=provider)
+
+
+@pytest.mark.django_db
+class TestCacheValidator(object):
+    """
+    Tests for CacheValidator model
+    """
+    def test_cache_validator_create(self):
+        user = get_user_model().objects.create(username='user', email='test@test.com', first_name='name',
+                                               last_name='surname')
+        provider = Provider.objects.create(name='github')
+        token = Token.objects.create(title='test', token='123456', provider=provider, user=user)
+        validator = CacheValidator.objects.create(token=token, url='/user/repos?page=1', etag='"123"')
+        assert CacheValidator.objects.count() == 1
+        assert str(validator) == '/user/repos?page=1'
+
+    def test_cache_validator_unique_url(self):
+        user = get_user_model().objects.create(username='user', email='test@test.com', first_name='name',
+                                               last_name='surname')
+        provider = Provider.objects.create(name='github')
+        token = Token.objects.create(title='test', token='123456', provider=provider, user=user)
+        CacheValidator.objects.create(token=token, url='/user/repos?page=1', etag='"123"')
+        with pytest.raises(IntegrityError):
+            CacheValidator.objects.create(token=token, url='/user/repos?page=1', etag='"456"')
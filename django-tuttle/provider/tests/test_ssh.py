@@ -0,0 +1,17 @@
+from provider.ssh import fingerprint
+
+
+def test_fingerprint():
+    key = 'ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAII3fYzX7xniCyGccfn09Vqjve4vpXR+NzZJUA21cllCR deploy'
+    assert fingerprint(key) == 'SHA256:8LlC6Jd/T23aTafao6OohlTvvOGFxdM4kc9T9ZxeRtE'
+
+
+def test_fingerprint_ignores_comment():
+    key = 'ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAII3fYzX7xniCyGccfn09Vqjve4vpXR+NzZJUA21cllCR'
+    assert fingerprint(key) == fingerprint(key + ' another comment')
+
+
+def test_fingerprint_invalid_key():
+    assert fingerprint('123456') == fingerprint('123456')
+    assert fingerprint('123456') != fingerprint('1234567')
+    assert fingerprint('ssh-rsa not-base64!').startswith('SHA256:')
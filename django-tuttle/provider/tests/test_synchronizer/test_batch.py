@@ -0,0 +1,27 @@
+import pytest
+
+from django.contrib.auth import get_user_model
+from provider.synchronizer.batch import synchronize_users
+
+
+@pytest.mark.django_db(transaction=True)
+def test_synchronize_users_stops_the_pool_on_errors():
+    """
+    Test that an error outside the synchronization terminates the pool and is raised
+    """
+    with pytest.raises(get_user_model().DoesNotExist):
+        list(synchronize_users([-1], workers=2))
+
+
+@pytest.mark.django_db
+def test_synchronize_users_reports_failures():
+    """
+    Test that a failing synchronization is reported in its outcome
+    """
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+
+    outcome, = synchronize_users([user.pk])
+
+    assert outcome.username == 'username'
+    assert outcome.error == 'DoesNotExist: Token matching query does not exist.'
+    assert outcome.duration >= 0
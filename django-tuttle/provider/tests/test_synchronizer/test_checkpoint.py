@@ -0,0 +1,52 @@
+import pytest
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from provider.models import SyncState
+from provider.synchronizer.checkpoint import finish_run, start_run
+
+
+@pytest.fixture
+def user():
+    return get_user_model().objects.create(username='username', email='test@test.it')
+
+
+@pytest.mark.django_db
+def test_start_run(user):
+    state = start_run(user)
+
+    assert (state.run, state.listing_page, state.listing_done, state.finished_at) == (1, 0, False, None)
+    assert state.started_at is not None
+
+
+@pytest.mark.django_db
+def test_start_run_resumes_interrupted_run(user):
+    SyncState.objects.create(user=user, run=3, listing_page=7, started_at=timezone.now())
+
+    state = start_run(user)
+
+    assert (state.run, state.listing_page) == (3, 7)
+
+
+@pytest.mark.django_db
+def test_start_run_after_finished_run(user):
+    finish_run(start_run(user))
+
+    state = start_run(user)
+
+    assert (state.run, state.finished_at) == (2, None)
+
+
+@pytest.mark.django_db
+def test_start_run_expired_checkpoint(user, settings):
+    """
+    Test that a checkpoint older than settings.SYNC_CHECKPOINT_TTL starts a new run
+    """
+    settings.SYNC_CHECKPOINT_TTL = 60
+    SyncState.objects.create(user=user, run=3, listing_page=7, listing_done=True,
+                             started_at=timezone.now() - timedelta(seconds=61))
+
+    state = start_run(user)
+
+    assert (state.run, state.listing_page, state.listing_done) == (4, 0, False)
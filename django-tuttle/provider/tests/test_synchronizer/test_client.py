@@ -0,0 +1,125 @@
+import pytest
+from github import Github, RateLimitExceededException, UnknownObjectException
+from provider.ssh import fingerprint
+from provider.synchronizer.client import GithubClient, PER_PAGE, parse, repository_params
+
+
+def github_client(github, validators=None):
+    requester = Github(github.token, base_url=github.url).get_user()._requester
+    return GithubClient(requester, validators)
+
+
+def test_repository_params():
+    data = {
+        'name': 'test',
+        'owner': {'login': 'organization', 'type': 'Organization'},
+        'private': True,
+        'permissions': {'admin': False},
+    }
+    assert repository_params(data) == {
+        'name': 'test',
+        'owner': 'organization',
+        'organization': 'organization',
+        'is_private': True,
+        'is_user_admin': False,
+    }
+
+
+def test_listing_modified_page(github):
+    """
+    Test that only the changed pages of the listing are read
+    """
+    for i in range(PER_PAGE + 1):
+        github.add_repository('repo-%s' % i)
+    client = github_client(github)
+    assert [(page, len(data)) for page, data in client.listing()] == [(1, PER_PAGE), (2, 1)]
+
+    github.add_repository('new')
+    client = github_client(github, client.responses)
+    pages = list(client.listing())
+
+    assert pages[0] == (1, None)
+    assert [repository['name'] for repository in pages[1][1]] == ['repo-%s' % PER_PAGE, 'new']
+    assert [status for method, path, status in github.requests[-2:]] == [304, 200]
+
+
+def test_listing_start(github):
+    """
+    Test that the listing is read from the given page
+    """
+    for i in range(PER_PAGE + 1):
+        github.add_repository('repo-%s' % i)
+
+    pages = list(github_client(github).listing(2))
+
+    assert [page for page, data in pages] == [2]
+    assert github.requests[-1][1] == '/user/repos?per_page=100&page=2'
+
+
+def test_pop_responses(github):
+    github.add_repository('test')
+    client = github_client(github)
+    list(client.listing())
+    client.keys('user test', 'test')
+
+    assert list(client.pop_responses('/repos/user%20test/test/keys')) == ['/repos/user%20test/test/keys?per_page=100']
+    assert list(client.pop_responses('/user/repos?page=1&per_page=100')) == ['/user/repos?page=1&per_page=100']
+    assert client.responses == {}
+
+
+def test_keys_pages(github):
+    """
+    Test that all the pages of the deploy keys are read
+    """
+    repository = github.add_repository('test')
+    for i in range(PER_PAGE + 1):
+        github.add_key(repository, 'key %s' % i, 'key-%s' % i)
+
+    keys = github_client(github).keys('user test', 'test')
+
+    assert len(keys) == PER_PAGE + 1
+    assert keys[-1]['title'] == 'key %s' % PER_PAGE
+    assert keys[-1]['key'] == 'key-%s' % PER_PAGE
+    assert keys[-1]['fingerprint'] == fingerprint('key-%s' % PER_PAGE)
+
+
+def test_last_modified_validator(github):
+    """
+    Test that the Last-Modified validator is sent back
+    """
+    github.add_repository('test')
+    client = github_client(github, {'/repos/user%20test/test/keys?per_page=100': ('', 'Mon, 01 Jan 2018 00:00:00 GMT')})
+    client.keys('user test', 'test')
+
+    assert client.responses['/repos/user%20test/test/keys?per_page=100'][0].startswith('"')
+
+
+def test_parse():
+    assert parse(b'') is None
+    assert parse(b'{"id": 1}') == {'id': 1}
+    assert parse('not json') == {'data': 'not json'}
+
+
+def test_not_found(github):
+    with pytest.raises(UnknownObjectException):
+        github_client(github).keys('user test', 'missing')
+
+
+def test_secondary_rate_limit_retried(github, settings):
+    """
+    Test that the requests refused by the secondary rate limit are retried
+    """
+    settings.SYNC_RATE_LIMIT_RETRIES = 2
+    github.add_repository('test')
+    github.secondary_limited = 2
+
+    assert len(list(github_client(github).listing())[0][1]) == 1
+    assert [status for method, path, status in github.requests[-3:]] == [403, 403, 200]
+
+
+def test_secondary_rate_limit_retries_exhausted(github, settings):
+    settings.SYNC_RATE_LIMIT_RETRIES = 1
+    github.secondary_limited = 2
+
+    with pytest.raises(RateLimitExceededException):
+        list(github_client(github).listing())
@@ -0,0 +1,58 @@
+import pytest
+
+from github import GithubException
+from provider.synchronizer.keys import fetch_keys
+from unittest.mock import MagicMock
+
+
+def test_fetch_keys():
+    """
+    Test that the keys of every repository are fetched
+    """
+    client = MagicMock()
+    client.keys.side_effect = lambda owner, name: [{'title': '%s key' % name, 'key': name}]
+    repositories = [('owner', 'repo-%s' % i) for i in range(20)]
+
+    keys = dict(fetch_keys(client, repositories, workers=4))
+
+    assert len(keys) == 20
+    assert keys[('owner', 'repo-3')] == [{'title': 'repo-3 key', 'key': 'repo-3'}]
+
+
+def test_fetch_keys_without_repositories():
+    assert list(fetch_keys(MagicMock(), [])) == []
+
+
+def test_fetch_keys_stops_on_error():
+    """
+    Test that the first error stops the pool and is raised
+    """
+    client = MagicMock()
+    client.keys.side_effect = GithubException(500, 'error')
+    repositories = [('owner', 'repo-%s' % i) for i in range(20)]
+
+    with pytest.raises(GithubException):
+        list(fetch_keys(client, repositories, workers=1))
+
+    assert client.keys.call_count == 1
+
+
+def test_fetch_keys_yields_before_error():
+    """
+    Test that the keys fetched before an error are yielded
+    """
+    def keys(owner, name):
+        if name == 'repo-2':
+            raise GithubException(500, 'error')
+        return []
+
+    client = MagicMock()
+    client.keys.side_effect = keys
+    repositories = [('owner', 'repo-%s' % i) for i in range(5)]
+    fetched = []
+
+    with pytest.raises(GithubException):
+        for natural_key, repository_keys in fetch_keys(client, repositories, workers=1):
+            fetched.append(natural_key)
+
+    assert fetched == [('owner', 'repo-0'), ('owner', 'repo-1')]
@@ -0,0 +1,118 @@
+import time
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from provider.models import Provider, Token
+from provider.synchronizer.ratelimit import RateLimiter, RateLimitParked, is_rate_limited
+
+
+class FakeSleep(object):
+    def __init__(self):
+        self.delays = []
+
+    def __call__(self, delay):
+        self.delays.append(delay)
+
+
+def test_is_rate_limited():
+    assert is_rate_limited(429, {}, None)
+    assert is_rate_limited(403, {'x-ratelimit-remaining': '0'}, {'message': 'API rate limit exceeded'})
+    assert is_rate_limited(403, {'retry-after': '10'}, None)
+    assert is_rate_limited(403, {}, {'message': 'You have exceeded a secondary rate limit'})
+    assert not is_rate_limited(403, {}, {'message': 'Must have admin rights to Repository.'})
+    assert not is_rate_limited(403, {}, ['unexpected'])
+    assert not is_rate_limited(404, {}, {'message': 'Not Found'})
+
+
+def test_acquire_with_unknown_budget():
+    sleep = FakeSleep()
+    RateLimiter(sleep=sleep).acquire()
+    assert sleep.delays == []
+
+
+def test_acquire_waits_a_close_reset(settings):
+    settings.SYNC_RATE_LIMIT_MAX_WAIT = 60
+    sleep = FakeSleep()
+    limiter = RateLimiter(0, timezone.now() + timedelta(seconds=30), sleep=sleep)
+
+    limiter.acquire()
+
+    assert len(sleep.delays) == 1
+    assert 0 < sleep.delays[0] <= 30
+
+
+def test_acquire_parks_a_far_reset(settings):
+    settings.SYNC_RATE_LIMIT_MAX_WAIT = 60
+    reset = (timezone.now() + timedelta(minutes=30)).replace(microsecond=0)
+    limiter = RateLimiter(0, reset, sleep=FakeSleep())
+
+    with pytest.raises(RateLimitParked) as ex:
+        limiter.acquire()
+    assert ex.value.reset == reset
+    assert 'parked until' in str(ex.value)
+
+
+def test_acquire_spreads_requests_below_the_low_water_mark(settings):
+    settings.SYNC_RATE_LIMIT_PACING = 0.1
+    sleep = FakeSleep()
+    limiter = RateLimiter(sleep=sleep)
+    limiter.update({'x-ratelimit-limit': '5000', 'x-ratelimit-remaining': '100',
+                    'x-ratelimit-reset': str(int(time.time()) + 1000)})
+
+    for i in range(3):
+        limiter.acquire()
+
+    # the first request goes now, the next ones every ~10s
+    assert len(sleep.delays) == 2
+    assert 9 < sleep.delays[0] < 11
+    assert 19 < sleep.delays[1] < 21
+
+
+def test_acquire_above_the_low_water_mark(settings):
+    sleep = FakeSleep()
+    limiter = RateLimiter(sleep=sleep)
+    limiter.update({'x-ratelimit-limit': '5000', 'x-ratelimit-remaining': '4000',
+                    'x-ratelimit-reset': str(int(time.time()) + 1000)})
+
+    limiter.acquire()
+    limiter.acquire()
+
+    assert sleep.delays == []
+
+
+def test_backoff(settings):
+    settings.SYNC_BACKOFF_BASE = 1
+    settings.SYNC_BACKOFF_MAX = 6
+    sleep = FakeSleep()
+    limiter = RateLimiter(sleep=sleep)
+
+    limiter.backoff(0, {})
+    limiter.backoff(1, {})
+    limiter.backoff(5, {})
+    limiter.backoff(0, {'retry-after': '7'})
+    limiter.backoff(0, {'x-ratelimit-remaining': '0'})
+
+    assert 0.5 <= sleep.delays[0] <= 1
+    assert 1 <= sleep.delays[1] <= 2
+    assert 3 <= sleep.delays[2] <= 6
+    assert sleep.delays[3] == 7
+    assert len(sleep.delays) == 4
+
+
+@pytest.mark.django_db
+def test_save():
+    user = get_user_model().objects.create(username='username', email='test@test.it')
+    token = Token.objects.create(title='test', token='123456', provider=Provider.objects.create(name='test'),
+                                 user=user)
+    reset = int(time.time()) + 100
+    limiter = RateLimiter.for_token(token)
+    limiter.update({'x-ratelimit-remaining': '10', 'x-ratelimit-reset': str(reset)})
+
+    limiter.save(token)
+
+    token = Token.objects.get()
+    assert token.rate_limit_remaining == 10
+    assert token.rate_limit_reset.timestamp() == reset
+    assert RateLimiter.for_token(token).reset == reset
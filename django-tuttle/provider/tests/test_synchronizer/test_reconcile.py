@@ -0,0 +1,223 @@
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from provider.models import CacheValidator, DeployKey, Provider, Repository, Token
+from provider.ssh import fingerprint
+from provider.synchronizer.reconcile import (chunked, finish_listing, prune_validators, reconcile_keys, reconcile_page,
+                                             save_validators)
+
+
+def repository_params(name, **kwargs):
+    params = {
+        'name': name,
+        'owner': 'user test',
+        'organization': None,
+        'is_private': False,
+        'is_user_admin': True,
+    }
+    params.update(kwargs)
+    return params
+
+
+@pytest.fixture
+def user():
+    return get_user_model().objects.create(username='username', email='test@test.it')
+
+
+@pytest.fixture
+def provider():
+    return Provider.objects.create(name='github')
+
+
+def test_chunked():
+    assert list(chunked([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+    assert list(chunked([], 2)) == []
+
+
+@pytest.mark.django_db
+def test_reconcile_page(user, provider):
+    """
+    Test that new repositories are inserted, changed ones updated and the ones no more
+    on the page detached from it
+    """
+    kept = Repository.objects.create(name='kept', owner='user test', listing_page=1, user=user, provider=provider)
+    changed = Repository.objects.create(name='changed', owner='user test', is_private=False, listing_page=1,
+                                        user=user, provider=provider)
+    removed = Repository.objects.create(name='removed', owner='user test', listing_page=1, user=user,
+                                        provider=provider)
+    other_page = Repository.objects.create(name='other', owner='user test', listing_page=2, user=user,
+                                           provider=provider)
+
+    repositories, changes = reconcile_page(user, provider, 1, [
+        repository_params('kept', is_user_admin=False),
+        repository_params('changed', is_private=True, is_user_admin=False),
+        repository_params('new', organization='organization'),
+    ])
+
+    assert changes == (1, 1, 0)
+    assert Repository.objects.get(pk=kept.pk).is_private is False
+    assert Repository.objects.get(pk=changed.pk).is_private is True
+    assert Repository.objects.get(name='new').organization == 'organization'
+    assert Repository.objects.get(name='new').listing_page == 1
+    assert Repository.objects.get(pk=removed.pk).listing_page is None
+    assert Repository.objects.get(pk=other_page.pk).listing_page == 2
+    assert repositories[('user test', 'new')].pk == Repository.objects.get(name='new').pk
+
+
+@pytest.mark.django_db
+def test_reconcile_page_moved_repository(user, provider):
+    """
+    Test that a repository moved to another page is updated with its new page
+    """
+    moved = Repository.objects.create(name='moved', owner='user test', listing_page=2, user=user, provider=provider)
+
+    changes = reconcile_page(user, provider, 1, [repository_params('moved')])[1]
+
+    assert changes == (0, 1, 0)
+    assert Repository.objects.get(pk=moved.pk).listing_page == 1
+
+
+@pytest.mark.django_db
+def test_reconcile_page_ignores_other_users(user, provider):
+    """
+    Test that the repositories of other users with the same name are left untouched
+    """
+    other = get_user_model().objects.create(username='other', email='other@test.it')
+    Repository.objects.create(name='test', owner='user test', listing_page=1, user=other, provider=provider)
+
+    reconcile_page(user, provider, 1, [repository_params('test')])
+
+    assert Repository.objects.filter(name='test').count() == 2
+    assert Repository.objects.get(user=other).listing_page == 1
+
+
+@pytest.mark.django_db
+def test_reconcile_page_constant_queries(user, provider, settings):
+    """
+    Test that the number of queries doesn't grow with the number of repositories
+    """
+    settings.SYNC_CHUNK_SIZE = 1000
+
+    def count_queries(listing):
+        with CaptureQueriesContext(connection) as context:
+            reconcile_page(user, provider, 1, listing)
+        return len(context.captured_queries)
+
+    small = count_queries([repository_params('repo-%s' % i) for i in range(2)])
+    Repository.objects.all().delete()
+    large = count_queries([repository_params('repo-%s' % i) for i in range(100)])
+
+    assert Repository.objects.count() == 100
+    assert small == large
+
+
+@pytest.mark.django_db
+def test_finish_listing(user, provider):
+    """
+    Test that the repositories no page listed are deleted with the keys of the not admin ones
+    """
+    listed = Repository.objects.create(name='listed', owner='user test', listing_page=2, is_user_admin=True, user=user,
+                                       provider=provider)
+    not_admin = Repository.objects.create(name='not admin', owner='user test', listing_page=1,
+                                          is_user_admin=False, user=user, provider=provider)
+    Repository.objects.create(name='detached', owner='user test', user=user, provider=provider)
+    Repository.objects.create(name='beyond', owner='user test', listing_page=3, user=user, provider=provider)
+    DeployKey.objects.create(title='kept', key='kept', repository=listed)
+    DeployKey.objects.create(title='removed', key='removed', repository=not_admin)
+
+    changes = finish_listing(user, provider, 2)
+
+    assert changes == (0, 0, 2)
+    assert set(Repository.objects.values_list('name', flat=True)) == {'listed', 'not admin'}
+    assert list(DeployKey.objects.values_list('title', flat=True)) == ['kept']
+
+
+def key_params(github_id, title, key):
+    return {'github_id': github_id, 'title': title, 'key': key, 'fingerprint': fingerprint(key)}
+
+
+@pytest.mark.django_db
+def test_reconcile_keys(user, provider):
+    """
+    Test that deploy keys are diffed against the stored ones
+    """
+    repository = Repository.objects.create(name='test', owner='user test', user=user, provider=provider)
+    other = Repository.objects.create(name='other', owner='user test', user=user, provider=provider)
+    kept = DeployKey.objects.create(title='old title', key='kept', github_id=1, repository=repository)
+    DeployKey.objects.create(title='removed', key='removed', github_id=2, repository=repository)
+    DeployKey.objects.create(title='other', key='other', github_id=3, repository=other)
+
+    changes = reconcile_keys({('user test', 'test'): repository}, {
+        ('user test', 'test'): [
+            key_params(1, 'new title', 'kept'),
+            key_params(4, 'new', 'new'),
+            key_params(4, 'new', 'new'),
+        ],
+    })
+
+    assert changes == (1, 1, 1)
+    assert set(DeployKey.objects.values_list('github_id', 'title', 'key')) == {(1, 'new title', 'kept'),
+                                                                               (3, 'other', 'other'),
+                                                                               (4, 'new', 'new')}
+    assert DeployKey.objects.get(key='kept').pk == kept.pk
+
+
+@pytest.mark.django_db
+def test_reconcile_keys_without_github_id(user, provider):
+    """
+    Test that the stored keys without github id are matched by fingerprint
+    """
+    repository = Repository.objects.create(name='test', owner='user test', user=user, provider=provider)
+    legacy = DeployKey.objects.create(title='legacy', key='legacy', repository=repository)
+    DeployKey.objects.create(title='duplicated', key='legacy', repository=repository)
+
+    changes = reconcile_keys({('user test', 'test'): repository}, {
+        ('user test', 'test'): [key_params(1, 'legacy', 'legacy')],
+    })
+
+    assert changes == (0, 1, 1)
+    assert DeployKey.objects.get().pk == legacy.pk
+    assert DeployKey.objects.get().github_id == 1
+
+
+@pytest.mark.django_db
+def test_reconcile_keys_unchanged(user, provider):
+    """
+    Test that the keys of repositories not modified on the provider are kept
+    """
+    repository = Repository.objects.create(name='test', owner='user test', user=user, provider=provider)
+    DeployKey.objects.create(title='kept', key='kept', github_id=1, repository=repository)
+
+    with CaptureQueriesContext(connection) as context:
+        changes = reconcile_keys({('user test', 'test'): repository}, {('user test', 'test'): None})
+
+    assert changes == (0, 0, 0)
+    assert DeployKey.objects.count() == 1
+    assert len(context.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_save_and_prune_validators(user, provider):
+    """
+    Test that validators are upserted and the ones of resources no more synchronized removed
+    """
+    token = Token.objects.create(title='test', token='123456', provider=provider, user=user)
+    CacheValidator.objects.create(token=token, url='/user/repos?page=1&per_page=100', etag='"old"')
+    CacheValidator.objects.create(token=token, url='/user/repos?page=2&per_page=100', etag='"removed"')
+    CacheValidator.objects.create(token=token, url='/repos/o/removed/keys?per_page=100', etag='"removed"')
+
+    changes = save_validators(token, {
+        '/user/repos?page=1&per_page=100': ('"new"', ''),
+        '/repos/o/n/keys?page=2&per_page=100': ('"keys"', ''),
+    })
+    assert changes == (1, 1, 0)
+    assert save_validators(token, {}) == (0, 0, 0)
+
+    changes = prune_validators(token, {'/user/repos?page=1&per_page=100'}, {'/repos/o/n/keys'})
+    assert changes == (0, 0, 2)
+    assert set(CacheValidator.objects.values_list('url', 'etag')) == {
+        ('/user/repos?page=1&per_page=100', '"new"'),
+        ('/repos/o/n/keys?page=2&per_page=100', '"keys"'),
+    }
@@ -94,6 +94,20 @@ CACHES = {
     }
 }
 
+# synchronization
+GITHUB_API_URL = env('GITHUB_API_URL', 'https://api.github.com')
+SYNC_CHUNK_SIZE = env('TUTTLE_SYNC_CHUNK_SIZE', 500)
+SYNC_KEY_WORKERS = env('TUTTLE_SYNC_KEY_WORKERS', 8)
+# longest wait for the rate limit reset before parking the synchronization (seconds)
+SYNC_RATE_LIMIT_MAX_WAIT = env('TUTTLE_SYNC_RATE_LIMIT_MAX_WAIT', 60)
+# fraction of the rate limit below which requests are spread until the reset
+SYNC_RATE_LIMIT_PACING = env('TUTTLE_SYNC_RATE_LIMIT_PACING', 0.1)
+SYNC_RATE_LIMIT_RETRIES = env('TUTTLE_SYNC_RATE_LIMIT_RETRIES', 5)
+SYNC_BACKOFF_BASE = env('TUTTLE_SYNC_BACKOFF_BASE', 1)
+SYNC_BACKOFF_MAX = env('TUTTLE_SYNC_BACKOFF_MAX', 60)
+# an interrupted synchronization younger than this resumes from its checkpoint (seconds)
+SYNC_CHECKPOINT_TTL = env('TUTTLE_SYNC_CHECKPOINT_TTL', 6 * 3600)
+
 # internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'